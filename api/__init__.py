@@ -2,8 +2,23 @@
 Flask api app
 """
 
+import os
 from .storage_engine import DBStorage
+from .email_filter import EmailFilter
+from .invalidation import InvalidationBus
+from .models import User
 
 storage = DBStorage()
 
 storage.reload()
+
+email_filter = EmailFilter.from_env()
+if email_filter.enabled:
+    email_filter.build(storage.scan(User.email))
+
+bus = InvalidationBus.from_env()
+bus.track(storage.session)
+if storage.committer:
+    bus.track(storage.committer.session)
+bus.start()
+os.register_at_fork(after_in_child=bus.after_fork)
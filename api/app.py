@@ -10,12 +10,13 @@ from flask_jwt_extended import (JWTManager, jwt_required, create_access_token, g
 from flask_cors import CORS
 import os
 from .config import Config
-from . import storage
+from . import storage, email_filter
 import datetime
 from uuid import uuid4
 
 
 config = Config
+MAX_BATCH_IDS = 100
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY')
 
@@ -85,14 +86,17 @@ def register():
             ]
         }), 422
 
-    # check if user exists
-    user = storage.fetch(User, limit=1, email=payload["email"])
-    if user:
-        return jsonify({
+    failure_res = {
             "status": "Bad request",
             "message": "Registration failed",
-            "statusCode": 400
-        }), 400
+            "statusCode": 400}
+
+    # check if user exists, definite misses of the filter skip the read
+    if email_filter.might_contain(payload["email"]):
+        user = storage.fetch(User, limit=1, email=payload["email"])
+        if user:
+            return jsonify(failure_res), 400
+        email_filter.record_false_positive()
     
     # create user
     payload['userId'] = str(uuid4())
@@ -102,7 +106,10 @@ def register():
     org = Organisation(name=org_name, orgId=user.userId)
     org.save()
     user.organisations.append(org)
-    user.save()
+    # unique email constraint still guards emails unknown to this process
+    if not user.save():
+        org.delete()
+        return jsonify(failure_res), 400
 
     # generate jwt token
     token = create_access_token(identity=user.userId)
@@ -187,6 +194,73 @@ def user(id):
 
     return {"message": "Unauthorized"}, 401
 
+@app.route("/api/users", strict_slashes=False, methods=["GET", "POST"])
+@jwt_required()
+def users():
+    """
+    Get many users by id in one request, ids are passed as ?ids=a,b,c
+    or as {"ids": [...]} in the body
+    """
+
+    if request.method == "POST":
+        payload = request.get_json(silent=True)
+        ids = payload.get("ids") if isinstance(payload, dict) else None
+    else:
+        ids = request.args.get("ids", "").split(",")
+
+    if not isinstance(ids, list) or not all(isinstance(i, str) for i in ids):
+        ids = []
+    ids = list(dict.fromkeys(i.strip() for i in ids if i.strip()))
+    if not ids or len(ids) > MAX_BATCH_IDS:
+        return {
+            "status": "Bad request",
+            "message": "Client error",
+            "statusCode": 400
+        }, 400
+
+    # caller is looked up in the same query as the requested users
+    identity = get_jwt_identity()
+    found = {u.userId: u
+             for u in storage.fetch_in(User, "userId", ids + [identity])}
+    if identity not in found:
+        return jsonify({"message": "User not found"}), 404
+
+    visible = storage.shared_members(identity, list(found))
+    visible.add(identity)
+
+    data, errors = [], []
+    for userId in ids:
+        if userId not in found:
+            errors.append({"userId": userId, "message": "User not found"})
+        elif userId not in visible:
+            errors.append({"userId": userId, "message": "Unauthorized"})
+        else:
+            data.append(found[userId].to_dict())
+
+    return {
+        "status": "success",
+        "message": "Users retrieved successfully",
+        "data": {
+            "users": data,
+            "errors": errors
+        }
+    }, 200
+
+@app.route("/api/stats", strict_slashes=False)
+@jwt_required()
+def stats():
+    """
+    Get runtime statistics of in-memory structures
+    """
+
+    return {
+        "status": "success",
+        "message": "Stats retrieved successfully",
+        "data": {
+            "emailFilter": email_filter.stats()
+        }
+    }, 200
+
 # yet to be implemented [Portected]
 @app.route("/api/organisations", strict_slashes=False, methods=["GET"])
 @jwt_required()
@@ -0,0 +1,146 @@
+"""
+Defines an in-memory probabilistic filter of registered emails
+"""
+
+import hashlib
+import math
+import os
+import threading
+
+
+class EmailFilter:
+    """
+    Counting bloom filter used to skip the database pre-read on registration.
+    A miss means the email was never registered through this process or
+    seen at startup, a hit only means it probably was.
+    """
+
+    def __init__(self, size=1 << 20, error_rate=0.01):
+        """
+        Initializes filter with `size` one byte counters and a target
+        false positive rate. A size of 0 disables the filter.
+        """
+
+        if size < 0:
+            raise ValueError("size must not be negative")
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+
+        self.size = size
+        self.error_rate = error_rate
+        self.hashes = max(1, round(-math.log2(error_rate)))
+        # number of items the filter holds before exceeding error_rate
+        self.capacity = int(size * math.log(2) ** 2 / -math.log(error_rate))
+        self.count = 0
+        self.lookups = 0
+        self.misses = 0
+        self.false_positives = 0
+        self.__counters = bytearray(size)
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Creates filter from EMAIL_FILTER_SIZE and EMAIL_FILTER_FP_RATE
+        """
+
+        return cls(size=int(os.getenv('EMAIL_FILTER_SIZE', 1 << 20)),
+                   error_rate=float(os.getenv('EMAIL_FILTER_FP_RATE', 0.01)))
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    def __positions(self, email):
+        digest = hashlib.blake2b(email.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def build(self, emails):
+        """
+        Adds every email of an iterable, e.g a streamed scan of users
+        """
+
+        for email in emails:
+            self.add(email)
+
+    def add(self, email):
+        """
+        Records a registered email
+        """
+
+        if not self.enabled or not email:
+            return
+        with self.__lock:
+            for pos in self.__positions(email):
+                # saturated counters are never decremented
+                if self.__counters[pos] < 255:
+                    self.__counters[pos] += 1
+            self.count += 1
+
+    def remove(self, email):
+        """
+        Forgets a deleted email
+        """
+
+        if not self.enabled or not email:
+            return
+        with self.__lock:
+            positions = self.__positions(email)
+            if not all(self.__counters[pos] for pos in positions):
+                return
+            for pos in positions:
+                if self.__counters[pos] < 255:
+                    self.__counters[pos] -= 1
+            self.count -= 1
+
+    def might_contain(self, email):
+        """
+        Returns False only if email is definitely not registered
+        """
+
+        if not self.enabled:
+            with self.__lock:
+                self.lookups += 1
+            return True
+        positions = self.__positions(email)
+        with self.__lock:
+            self.lookups += 1
+            if all(self.__counters[pos] for pos in positions):
+                return True
+            self.misses += 1
+            return False
+
+    def record_false_positive(self):
+        """
+        Counts a probable hit that the database did not confirm, a
+        disabled filter has no hits to count
+        """
+
+        if not self.enabled:
+            return
+        with self.__lock:
+            self.false_positives += 1
+
+    def stats(self):
+        """
+        Returns filter statistics in dictionary format
+        """
+
+        fp_rate = 1.0
+        if self.enabled:
+            fill = 1 - math.exp(-self.hashes * self.count / self.size)
+            fp_rate = fill ** self.hashes
+        return {
+            "enabled": self.enabled,
+            "sizeBytes": self.size,
+            "hashes": self.hashes,
+            "capacity": self.capacity,
+            "count": self.count,
+            "targetFalsePositiveRate": self.error_rate,
+            "estimatedFalsePositiveRate": fp_rate,
+            "lookups": self.lookups,
+            "definiteMisses": self.misses,
+            "falsePositives": self.false_positives,
+        }
@@ -0,0 +1,217 @@
+"""
+Defines a group committer that coalesces concurrent writes into one commit
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.orm import sessionmaker, attributes
+
+
+class GroupCommitter:
+    """
+    Applies writes submitted by request threads in a single writer thread.
+    Writes arriving within `window` seconds of the first one, or up to
+    `max_ops` of them, share a transaction and a commit. Every write runs
+    in its own savepoint so a failing write does not affect the others.
+    """
+
+    def __init__(self, engine, window=0.002, max_ops=64, timeout=30):
+        """
+        Initializes committer writing through its own connections of engine,
+        callers wait at most `timeout` seconds for their write
+        """
+
+        self.window = window
+        self.max_ops = max_ops
+        self.timeout = timeout
+        self.batches = 0
+        self.ops = 0
+        self.failed = 0
+        if engine.dialect.name == "sqlite":
+            engine = self.__sqlite_engine(engine.url)
+        self.session = sessionmaker(bind=engine, expire_on_commit=False)
+        # registered before any other listener, marks a durable commit even
+        # if a later after_commit listener raises
+        event.listen(self.session, "after_commit", self.__committed)
+        self.__queue = queue.Queue()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    @staticmethod
+    def __sqlite_engine(url):
+        # pysqlite defers BEGIN and breaks SAVEPOINT, so the writer
+        # engine issues BEGIN itself and takes the write lock up front
+        engine = create_engine(url, connect_args={"timeout": 30})
+
+        @event.listens_for(engine, "connect")
+        def connect(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(engine, "begin")
+        def begin(conn):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+        return engine
+
+    @staticmethod
+    def __committed(session):
+        # after_commit also fires when a savepoint is released
+        if not session.in_nested_transaction():
+            session.info["committed"] = True
+
+    def submit(self, new, dirty, deleted):
+        """
+        Queues pending objects of a session, returns a future resolved
+        once they are committed
+        """
+
+        future = Future()
+        self.__queue.put((list(new), list(dirty), list(deleted), future))
+        return future
+
+    def stop(self):
+        """
+        Stops the writer thread once queued writes are committed
+        """
+
+        self.__queue.put(None)
+        self.__thread.join()
+
+    def __run(self):
+        stopping = False
+        while not stopping:
+            op = self.__queue.get()
+            if op is None:
+                break
+            batch = [op]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_ops:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    op = self.__queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if op is None:
+                    stopping = True
+                    break
+                batch.append(op)
+
+            # every future is resolved and the thread keeps running
+            # whatever goes wrong with this batch
+            try:
+                results = self.__commit(batch)
+            except Exception as e:
+                results = []
+                error = e
+            else:
+                error = RuntimeError("write was not applied")
+            resolved = {id(future) for future, _ in results}
+            results += [(op[-1], error) for op in batch
+                        if id(op[-1]) not in resolved]
+            self.batches += 1
+            self.ops += len(batch)
+            for future, error in results:
+                if future.done():
+                    continue
+                if error:
+                    self.failed += 1
+                    future.set_exception(error)
+                else:
+                    future.set_result(None)
+
+    def __commit(self, batch):
+        session = self.session()
+        results = []
+        try:
+            for new, dirty, deleted, future in batch:
+                # skip writes their caller gave up on before they started
+                if not future.set_running_or_notify_cancel():
+                    continue
+                savepoint = session.begin_nested()
+                try:
+                    self.__apply(session, new, dirty, deleted)
+                    savepoint.commit()
+                    results.append((future, None))
+                except Exception as e:
+                    savepoint.rollback()
+                    results.append((future, e))
+            session.commit()
+        except Exception as e:
+            if not session.info.get("committed"):
+                session.rollback()
+                results = [(op[-1], e) for op in batch]
+        finally:
+            try:
+                session.close()
+            except Exception:
+                pass
+        return results
+
+    @staticmethod
+    def __apply(session, new, dirty, deleted):
+        # prefill scalar primary key defaults so an object reached both
+        # directly and through a relationship is merged only once
+        for obj in new:
+            mapper = inspect(obj).mapper
+            for column in mapper.primary_key:
+                key = mapper.get_property_by_column(column).key
+                if getattr(obj, key) is None and column.default is not None \
+                        and column.default.is_scalar:
+                    setattr(obj, key, column.default.arg)
+
+        # merge copies a dynamic collection from the database instead of
+        # its pending changes, so those are merged first and their
+        # history is replayed on the copies afterwards
+        objs = sorted((*new, *dirty), key=lambda obj: not dynamic(obj))
+        merged = [(obj, session.merge(obj)) for obj in objs]
+        copies = {id(obj): copy for obj, copy in merged}
+        for obj, copy in merged:
+            for key in dynamic(obj):
+                history = attributes.get_history(obj, key)
+                current = getattr(copy, key)
+                for item in history.deleted:
+                    item = copies.get(id(item)) or session.merge(item)
+                    if item in current:
+                        current.remove(item)
+                for item in history.added:
+                    item = copies.get(id(item)) or session.merge(item)
+                    if item not in current:
+                        current.append(item)
+        for obj in deleted:
+            session.delete(session.merge(obj))
+        session.flush()
+        # hand generated primary keys back to the submitted objects
+        for obj, copy in merged:
+            mapper = inspect(obj).mapper
+            for column in mapper.primary_key:
+                key = mapper.get_property_by_column(column).key
+                if getattr(obj, key) is None:
+                    setattr(obj, key, getattr(copy, key))
+
+    def stats(self):
+        """
+        Returns committer statistics in dictionary format
+        """
+
+        return {
+            "window": self.window,
+            "maxOps": self.max_ops,
+            "batches": self.batches,
+            "ops": self.ops,
+            "failed": self.failed,
+            "meanBatchSize": self.ops / self.batches if self.batches else 0.0,
+        }
+
+
+def dynamic(obj):
+    """
+    Returns the names of dynamic relationships of obj
+    """
+
+    return [rel.key for rel in inspect(obj).mapper.relationships
+            if rel.lazy == "dynamic"]
@@ -0,0 +1,287 @@
+"""
+Defines a cache invalidation bus shared by workers through a sqlite outbox
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from sqlalchemy import event
+from sqlalchemy.orm import attributes
+from .models import User, Organisation
+
+
+class InvalidationBus:
+    """
+    Publishes change events for users, organisations and user_organisation
+    rows. Events are delivered to local subscribers at once and, when an
+    outbox path is set, written to an outbox table that other workers poll,
+    so no outside service is needed.
+    """
+
+    def __init__(self, path="", interval=0.05, retention=60):
+        """
+        Initializes bus, an empty path keeps events inside this process
+        """
+
+        self.path = path
+        self.interval = interval
+        self.retention = retention
+        self.published = 0
+        self.received = 0
+        self.failed = 0
+        self.callback_errors = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+        self.__subscribers = []
+        self.__last_id = 0
+        self.__started = False
+        self.__reset()
+        # only deliver events published after startup, the connection is
+        # closed so that none is open when a worker is forked
+        if path:
+            self.__last_id = self.__connection().execute(
+                "SELECT MAX(id) FROM outbox").fetchone()[0] or 0
+            self.__conn.close()
+            self.__conn = None
+
+    def __reset(self):
+        self.origin = uuid.uuid4().hex
+        self.__conn = None
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__thread = None
+        self.__pruned = 0.0
+
+    def after_fork(self):
+        """
+        Gives a forked worker its own origin, connection and polling
+        thread, e.g under gunicorn --preload
+        """
+
+        self.__reset()
+        if self.__started:
+            self.__started = False
+            self.start()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Creates bus from INVALIDATION_OUTBOX and INVALIDATION_POLL_INTERVAL
+        """
+
+        return cls(path=os.getenv('INVALIDATION_OUTBOX', ''),
+                   interval=float(os.getenv('INVALIDATION_POLL_INTERVAL', 0.05)))
+
+    def __connection(self):
+        # opened on first use so each process gets its own connection
+        if not self.path:
+            return None
+        if self.__conn is None:
+            conn = sqlite3.connect(self.path, timeout=10,
+                                   check_same_thread=False,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "tbl TEXT NOT NULL, key TEXT NOT NULL, "
+                "origin TEXT NOT NULL, created REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS outbox_created "
+                         "ON outbox (created)")
+            self.__conn = conn
+        return self.__conn
+
+    def subscribe(self, callback, table=None):
+        """
+        Registers callback(table, key), optionally for a single table
+        """
+
+        self.__subscribers.append((table, callback))
+
+    def unsubscribe(self, callback):
+        """
+        Removes every registration of callback
+        """
+
+        self.__subscribers = [(tbl, cb) for tbl, cb in self.__subscribers
+                              if cb is not callback]
+
+    def __deliver(self, table, key):
+        # a failing subscriber must not stop delivery to the others
+        for tbl, callback in self.__subscribers:
+            if tbl is None or tbl == table:
+                try:
+                    callback(table, key)
+                except Exception:
+                    self.callback_errors += 1
+
+    def publish(self, events):
+        """
+        Publishes (table, key) events to local subscribers and the outbox
+        """
+
+        events = list(events)
+        if not events:
+            return
+        for table, key in events:
+            self.__deliver(table, key)
+        self.published += len(events)
+
+        with self.__lock:
+            conn = self.__connection()
+            if not conn:
+                return
+            conn.executemany(
+                "INSERT INTO outbox (tbl, key, origin, created) "
+                "VALUES (?, ?, ?, ?)",
+                [(table, key, self.origin, time.time())
+                 for table, key in events])
+
+    def poll(self):
+        """
+        Delivers outbox events published by other workers since last poll
+        """
+
+        with self.__lock:
+            conn = self.__connection()
+            if not conn:
+                return 0
+            rows = conn.execute(
+                "SELECT id, tbl, key, origin, created FROM outbox "
+                "WHERE id > ? ORDER BY id", (self.__last_id,)).fetchall()
+        now = time.time()
+        delivered = 0
+        for row_id, table, key, origin, created in rows:
+            self.__last_id = row_id
+            if origin == self.origin:
+                continue
+            self.__deliver(table, key)
+            lag = max(now - created, 0.0)
+            self.lag_total += lag
+            self.lag_max = max(self.lag_max, lag)
+            delivered += 1
+        self.received += delivered
+        return delivered
+
+    def prune(self):
+        """
+        Deletes outbox events older than the retention period
+        """
+
+        now = time.time()
+        with self.__lock:
+            conn = self.__connection()
+            if conn:
+                conn.execute("DELETE FROM outbox WHERE created < ?",
+                             (now - self.retention,))
+        self.__pruned = now
+
+    def __run(self):
+        while not self.__stop.wait(self.interval):
+            try:
+                self.poll()
+                if time.time() - self.__pruned > self.retention:
+                    self.prune()
+            except Exception:
+                self.failed += 1
+
+    def start(self):
+        """
+        Starts polling the outbox in a daemon thread
+        """
+
+        if self.path and not self.__thread:
+            self.__started = True
+            self.__stop.clear()
+            self.__thread = threading.Thread(target=self.__run, daemon=True)
+            self.__thread.start()
+
+    def stop(self):
+        """
+        Stops the polling thread
+        """
+
+        self.__started = False
+        self.__stop.set()
+        if self.__thread:
+            self.__thread.join()
+            self.__thread = None
+
+    def track(self, session):
+        """
+        Publishes committed User, Organisation and membership changes
+        of a session or session factory
+        """
+
+        # relationship history may be gone after a flush and generated
+        # keys are only known after it, so both sides are collected
+        event.listen(session, "before_flush", self.__collect)
+        event.listen(session, "after_flush", self.__collect)
+        event.listen(session, "after_commit", self.__flush_pending)
+        event.listen(session, "after_soft_rollback", self.__discard)
+
+    def __collect(self, session, flush_context, instances=None):
+        pending = session.info.setdefault("invalidations", set())
+        deleted = set(session.deleted)
+        with session.no_autoflush:
+            for obj in (*session.new, *session.dirty, *deleted):
+                if isinstance(obj, User):
+                    events = [("users", obj.userId)]
+                    history = attributes.get_history(obj, "organisations")
+                    orgs = [*history.added, *history.deleted]
+                    # the secondary rows of a deleted user go with it
+                    if obj in deleted:
+                        orgs += list(obj.organisations)
+                    pairs = [(obj.userId, org.orgId) for org in orgs]
+                elif isinstance(obj, Organisation):
+                    events = [("organisations", obj.orgId)]
+                    history = attributes.get_history(obj, "users")
+                    users = [*history.added, *history.deleted]
+                    if obj in deleted:
+                        users += list(obj.users)
+                    pairs = [(user.userId, obj.orgId) for user in users]
+                else:
+                    continue
+                events += [membership_key(*pair) for pair in pairs
+                           if None not in pair]
+                pending.update(e for e in events if e[1] is not None)
+
+    def __flush_pending(self, session):
+        # a released savepoint is not durable yet, wait for the outer commit
+        if session.in_nested_transaction():
+            return
+        # the transaction is already committed, count instead of raising
+        try:
+            self.publish(session.info.pop("invalidations", ()))
+        except sqlite3.Error:
+            self.failed += 1
+
+    def __discard(self, session, previous_transaction):
+        # a rolled back savepoint leaves the rest of the transaction intact
+        if not previous_transaction.nested:
+            session.info.pop("invalidations", None)
+
+    def stats(self):
+        """
+        Returns bus statistics in dictionary format
+        """
+
+        return {
+            "outbox": self.path,
+            "published": self.published,
+            "received": self.received,
+            "failed": self.failed,
+            "callbackErrors": self.callback_errors,
+            "meanLag": self.lag_total / self.received if self.received else 0.0,
+            "maxLag": self.lag_max,
+        }
+
+
+def membership_key(userId, orgId):
+    """
+    Returns the event for a user_organisation row
+    """
+
+    return ("user_organisation", f"{userId}:{orgId}")
@@ -3,6 +3,7 @@ Defines Models for User and Organisation
 """
 
 from sqlalchemy import String, Column, ForeignKey, Table
+from sqlalchemy import inspect
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from uuid import uuid4
@@ -16,27 +17,34 @@ class BaseModel:
 
     def save(self):
         """
-        saves object to the data base
+        saves object to the data base, returns False on failure
         """
 
-        from .app import storage
+        from .app import storage, email_filter
+        is_new = inspect(self).transient
         try:
             storage.new(self)
             storage.save()
         except Exception:
             storage.rollback()
+            return False
+        if is_new and self.__class__ == User:
+            email_filter.add(self.email)
+        return True
 
     def delete(self):
         """
         deletes object from the data base
         """
 
-        from .app import storage
+        from .app import storage, email_filter
         if self.__class__ == User:
             for org in self.organisations:
                 storage.delete(org)
         storage.delete(self)
         storage.save()
+        if self.__class__ == User:
+            email_filter.remove(self.email)
 
 class User(BaseModel, Base):
     """
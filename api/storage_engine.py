@@ -1,7 +1,11 @@
 import os
+from concurrent import futures
 from sqlalchemy import create_engine, URL
-from sqlalchemy.orm import sessionmaker, scoped_session
-from .models import User, Organisation, Base
+from sqlalchemy import inspect
+from sqlalchemy.orm import (sessionmaker, scoped_session, aliased,
+                            make_transient_to_detached)
+from .models import User, Organisation, Base, user_organisation
+from .group_commit import GroupCommitter
 
 
 class DBStorage:
@@ -20,6 +24,12 @@ class DBStorage:
     def engine(self):
         return self.__engine
 
+    @property
+    def session(self):
+        return self.__session
+
+    committer = None
+
     def __init__(self):
 
         connection_string = URL.create('postgresql',
@@ -47,6 +57,42 @@ class DBStorage:
         except Exception:
             self.rollback()
 
+    def fetch_in(self, cls, attr, values):
+        """
+        fetchs all objects whose attr is one of values in a single query
+        """
+        try:
+            return self.__session.query(cls).filter(
+                getattr(cls, attr).in_(values)).all()
+        except Exception:
+            self.rollback()
+            return []
+
+    def shared_members(self, userId, userIds):
+        """
+        returns the ids in userIds that share an organisation with userId
+        """
+        caller = aliased(user_organisation)
+        other = aliased(user_organisation)
+        try:
+            rows = self.__session.query(other.c.user_id).join(
+                caller, caller.c.organisation_id == other.c.organisation_id
+            ).filter(caller.c.user_id == userId,
+                     other.c.user_id.in_(userIds)).distinct()
+            return {row[0] for row in rows}
+        except Exception:
+            self.rollback()
+            return set()
+
+    def scan(self, *columns, batch_size=1000):
+        """
+        streams column values in batches instead of loading all rows
+        """
+
+        query = self.__session.query(*columns).yield_per(batch_size)
+        for row in query:
+            yield row[0] if len(columns) == 1 else tuple(row)
+
     def reload(self):
         """
         Reloads the database
@@ -56,15 +102,72 @@ class DBStorage:
         Base.metadata.create_all(self.__engine)
 
         # Create a session
-        session = sessionmaker(bind=self.__engine, expire_on_commit=False)
+        session = sessionmaker(bind=self.__engine, expire_on_commit=False,
+                               autoflush=not self.committer)
         self.__session = scoped_session(session)
 
+        # Coalesce writes of concurrent requests when a window is set
+        window = float(os.getenv('GROUP_COMMIT_WINDOW_MS', 0)) / 1000
+        if window > 0 and not self.committer:
+            self.enable_group_commit(
+                window, max_ops=int(os.getenv('GROUP_COMMIT_MAX_OPS', 64)),
+                timeout=float(os.getenv('GROUP_COMMIT_TIMEOUT', 30)))
+
+    def enable_group_commit(self, window, max_ops=64, timeout=30):
+        """
+        Hands writes to a group committer, request sessions then never
+        flush themselves
+        """
+
+        self.committer = GroupCommitter(self.__engine, window=window,
+                                        max_ops=max_ops, timeout=timeout)
+        self.__session.remove()
+        self.__session.configure(autoflush=False)
+
+    def disable_group_commit(self):
+        """
+        Stops the group committer and commits in request sessions again
+        """
+
+        if self.committer:
+            self.committer.stop()
+            self.committer = None
+        self.__session.remove()
+        self.__session.configure(autoflush=True)
+
     def save(self):
         """
         saves data to database
         """
 
-        self.__session.commit()
+        if not self.committer:
+            self.__session.commit()
+            return
+
+        new = list(self.__session.new)
+        deleted = list(self.__session.deleted)
+        future = self.committer.submit(new, self.__session.dirty, deleted)
+        try:
+            try:
+                future.result(timeout=self.committer.timeout)
+            except futures.TimeoutError:
+                # a write that already started may still be committed,
+                # so only one that never ran is reported as failed
+                if future.cancel():
+                    raise
+                future.result()
+        except Exception:
+            self.__session.rollback()
+            raise
+
+        # drop pending state, committed rows are reloaded when accessed
+        for obj in deleted:
+            self.__session.expunge(obj)
+        self.__session.rollback()
+        for obj in new:
+            if inspect(obj).transient:
+                make_transient_to_detached(obj)
+                self.__session.add(obj)
 
     def close(self):
         """
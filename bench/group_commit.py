@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+"""
+Measures organisation write throughput and latency for group commit windows
+
+usage: python -m bench.group_commit [threads] [writes_per_thread] [windows_ms...]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from uuid import uuid4
+
+
+def run(threads, count):
+    """
+    Saves organisations from concurrent threads with the storage of this
+    process, prints throughput, latency and batch statistics
+    """
+
+    from api import storage
+    from api.models import Organisation
+
+    latencies = []
+    failures = []
+
+    def write():
+        for _ in range(count):
+            org = Organisation(orgId=str(uuid4()), name="bench")
+            started = time.perf_counter()
+            ok = org.save()
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                failures.append(org)
+        storage.close()
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=write) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    batch = storage.committer.stats()["meanBatchSize"] \
+        if storage.committer else 1.0
+    window = os.getenv('GROUP_COMMIT_WINDOW_MS', '0')
+    print(f"{window:>9} {len(latencies) / elapsed:>10.0f} {p50:>9.2f} "
+          f"{p99:>9.2f} {batch:>6.1f} {len(failures):>6}")
+
+
+def main(threads=8, count=100, *windows):
+    print(f"threads: {threads}, writes: {threads * count}")
+    print(f"{'window_ms':>9} {'writes/s':>10} {'p50_ms':>9} "
+          f"{'p99_ms':>9} {'batch':>6} {'failed':>6}")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for window in windows or ("0", "0.5", "2", "5", "10"):
+        env = dict(os.environ, FLASK_ENV="test", PYTHONPATH=root,
+                   GROUP_COMMIT_WINDOW_MS=window, INVALIDATION_OUTBOX="")
+        subprocess.run([sys.executable, "-m", "bench.group_commit",
+                        "--run", str(threads), str(count)],
+                       env=env, cwd=tempfile.mkdtemp(), check=True)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--run"]:
+        run(int(sys.argv[2]), int(sys.argv[3]))
+    else:
+        main(*(int(a) for a in sys.argv[1:3]), *sys.argv[3:])
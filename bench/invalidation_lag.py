@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+"""
+Measures invalidation lag between workers under write load
+
+usage: python -m bench.invalidation_lag [writers] [events_per_writer] [rate]
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from api.invalidation import InvalidationBus
+
+
+def write(path, count, rate):
+    """
+    Publishes `count` user events at about `rate` events per second
+    """
+
+    bus = InvalidationBus(path=path)
+    for i in range(count):
+        bus.publish([("users", f"{os.getpid()}-{i}")])
+        time.sleep(1 / rate)
+
+
+def main(writers=4, count=500, rate=200.0):
+    path = os.path.join(tempfile.mkdtemp(), "outbox.db")
+    reader = InvalidationBus(path=path, interval=0.01)
+    reader.start()
+
+    started = time.time()
+    procs = [multiprocessing.Process(target=write, args=(path, count, rate))
+             for _ in range(writers)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+    elapsed = time.time() - started
+
+    # let the reader drain the outbox
+    deadline = time.time() + 5
+    while reader.received < writers * count and time.time() < deadline:
+        time.sleep(0.01)
+    reader.stop()
+
+    stats = reader.stats()
+    print(f"writers: {writers}, events: {writers * count}, "
+          f"write rate: {writers * count / elapsed:.0f}/s")
+    print(f"received: {stats['received']}, "
+          f"mean lag: {stats['meanLag'] * 1000:.1f}ms, "
+          f"max lag: {stats['maxLag'] * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main(*(t(a) for t, a in zip((int, int, float), sys.argv[1:])))
@@ -194,5 +194,69 @@ class AuthTestCase(unittest.TestCase):
         })
 
         self.assertEqual(response.status_code, 200)
+
+
+    def test_batch_users_retrieval(self):
+        """
+        Test retrieving many users at once with per id errors
+        """
+
+        res_for_clint = self.client.post('/auth/login', json={
+            "email": "wu@gmail.com",
+            "password": "password_uwvudwonoziw"
+        })
+        data = json.loads(res_for_clint.data)
+        headers = {
+            'Authorization': 'Bearer ' + data.get('data').get('accessToken')
+        }
+
+        other = User(firstName="Ngozi", lastName="Eze",
+                     email="ngozi@gmail.com", password="password_ngozi")
+        other.userId = str(uuid.uuid4())
+        other.save()
+        missing = str(uuid.uuid4())
+
+        response = self.client.get('/api/users?ids={},{},{}'.format(
+            self.user_clint.userId, other.userId, missing), headers=headers)
+        self.assertEqual(response.status_code, 200)
+        body = json.loads(response.data)['data']
+        self.assertEqual(body['users'], [self.user_clint.to_dict()])
+        self.assertEqual(body['errors'], [
+            {"userId": other.userId, "message": "Unauthorized"},
+            {"userId": missing, "message": "User not found"}
+        ])
+
+        # adds user to common organisation
+        clint_org = self.user_clint.organisations[0]
+        self.client.post('/api/organisations/{}/users'\
+                         .format(clint_org.orgId),
+                                 json={"userId": other.userId})
+        response = self.client.post('/api/users', headers=headers,
+                                    json={"ids": [other.userId]})
+        self.assertEqual(response.status_code, 200)
+        body = json.loads(response.data)['data']
+        self.assertEqual(body['users'], [other.to_dict()])
+        self.assertEqual(body['errors'], [])
+
+        response = self.client.get('/api/users', headers=headers)
+        self.assertEqual(response.status_code, 400)
+        for payload in ([1, 2], "abc", {"ids": "abc"}):
+            response = self.client.post('/api/users', headers=headers,
+                                        json=payload)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(json.loads(response.data)['message'],
+                             "Client error")
+
+        # leaves clint's organisation in place, delete() removes every
+        # organisation the user belongs to
+        other = storage.fetch(User, limit=1, userId=other.userId)
+        clint_org = storage.fetch(Organisation, limit=1, orgId=clint_org.orgId)
+        clint_org.users.remove(other)
+        clint_org.save()
+        other.delete()
+        self.assertIsNotNone(
+            storage.fetch(Organisation, limit=1, orgId=clint_org.orgId))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+"""
+Tests for the registered email filter
+"""
+
+from api.app import app, storage, email_filter
+from api.email_filter import EmailFilter
+import unittest
+from api.models import User, Organisation
+
+app.config['TESTING'] = True
+
+class EmailFilterTestCase(unittest.TestCase):
+    """
+    Tests for the counting bloom filter of emails
+    """
+
+    def test_add_and_remove(self):
+        """
+        Test filter membership after insert and delete
+        """
+        emails = EmailFilter(size=4096, error_rate=0.01)
+        emails.build(["a@example.com", "b@example.com"])
+
+        self.assertTrue(emails.might_contain("a@example.com"))
+        self.assertTrue(emails.might_contain("b@example.com"))
+        self.assertFalse(emails.might_contain("c@example.com"))
+
+        emails.remove("a@example.com")
+        self.assertFalse(emails.might_contain("a@example.com"))
+        self.assertTrue(emails.might_contain("b@example.com"))
+
+        stats = emails.stats()
+        self.assertEqual(stats["count"], 1)
+        self.assertEqual(stats["hashes"], 7)
+        self.assertEqual(stats["definiteMisses"], 2)
+
+    def test_disabled_filter(self):
+        """
+        Test that a zero sized filter never reports a miss
+        """
+        emails = EmailFilter(size=0)
+        emails.add("a@example.com")
+
+        self.assertTrue(emails.might_contain("c@example.com"))
+        emails.record_false_positive()
+        self.assertFalse(emails.stats()["enabled"])
+        self.assertEqual(emails.stats()["falsePositives"], 0)
+        self.assertEqual(emails.stats()["lookups"], 1)
+
+    def test_registration_updates_filter(self):
+        """
+        Test that registration and deletion keep the filter current
+        """
+        client = app.test_client()
+        response = client.post('/auth/register', json={
+            "firstName": "Ada",
+            "lastName": "Obi",
+            "email": "ada.filter@example.com",
+            "password": "password_ada",
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(email_filter.might_contain("ada.filter@example.com"))
+
+        token = response.get_json()["data"]["accessToken"]
+        response = client.get('/api/stats', headers={
+            'Authorization': 'Bearer ' + token
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["data"]["emailFilter"],
+                         email_filter.stats())
+
+        # a definite miss for a registered email still fails on insert
+        email_filter.remove("ada.filter@example.com")
+        orgs = len(storage.fetch(Organisation))
+        response = client.post('/auth/register', json={
+            "firstName": "Ada",
+            "lastName": "Obi",
+            "email": "ada.filter@example.com",
+            "password": "password_ada",
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(storage.fetch(Organisation)), orgs)
+
+        ada = storage.fetch(User, limit=1, email="ada.filter@example.com")
+        email_filter.add(ada.email)
+        ada.delete()
+        self.assertFalse(email_filter.might_contain("ada.filter@example.com"))
+
+
+if __name__ == "__main__":
+    unittest.main()
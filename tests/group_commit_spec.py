@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+
+"""
+Tests for group commit of concurrent writes
+"""
+
+from api.app import app, storage
+from api.group_commit import GroupCommitter
+from api.models import Base, User, Organisation
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.exc import IntegrityError
+import os
+import tempfile
+import time
+import unittest
+import uuid
+
+app.config['TESTING'] = True
+
+class GroupCommitTestCase(unittest.TestCase):
+    """
+    Tests for coalescing writes and isolating failures
+    """
+
+    def setUp(self):
+        """
+        Set up a committer on an empty database
+        """
+
+        path = os.path.join(tempfile.mkdtemp(), "group.db")
+        self.engine = create_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(self.engine)
+        self.committer = GroupCommitter(self.engine, window=0.2, max_ops=5)
+
+    def tearDown(self):
+        """
+        Stop the writer thread
+        """
+
+        self.committer.stop()
+
+    def test_writes_share_commit(self):
+        """
+        Test that writes within the window are committed together
+        """
+        futures = [self.committer.submit(
+            [Organisation(orgId=f"org-{i}", name=f"Org {i}")], [], [])
+            for i in range(5)]
+        for future in futures:
+            self.assertIsNone(future.result(timeout=5))
+
+        stats = self.committer.stats()
+        self.assertEqual(stats["ops"], 5)
+        self.assertEqual(stats["batches"], 1)
+
+    def test_failed_write_is_isolated(self):
+        """
+        Test that one failing write does not roll back the others
+        """
+        ok = self.committer.submit(
+            [Organisation(orgId="org-a", name="A")], [], [])
+        bad = self.committer.submit(
+            [Organisation(orgId="org-b", name=None)], [], [])
+        other = self.committer.submit(
+            [Organisation(orgId="org-c", name="C")], [], [])
+
+        self.assertIsNone(ok.result(timeout=5))
+        self.assertIsNone(other.result(timeout=5))
+        self.assertIsInstance(bad.exception(timeout=5), IntegrityError)
+
+        with self.committer.session() as session:
+            names = sorted(org.name for org in session.query(Organisation))
+        self.assertEqual(names, ["A", "C"])
+        self.assertEqual(self.committer.stats()["batches"], 1)
+
+    def test_writer_survives_failing_listener(self):
+        """
+        Test that a listener raising after commit neither fails the
+        committed write nor stops the writer thread
+        """
+        def broken(session):
+            if not session.in_nested_transaction():
+                raise ValueError("listener")
+
+        event.listen(self.committer.session, "after_commit", broken)
+        first = self.committer.submit(
+            [Organisation(orgId="org-a", name="A")], [], [])
+        self.assertIsNone(first.result(timeout=5))
+
+        event.remove(self.committer.session, "after_commit", broken)
+        second = self.committer.submit(
+            [Organisation(orgId="org-b", name="B")], [], [])
+        self.assertIsNone(second.result(timeout=5))
+
+
+class StorageGroupCommitTestCase(unittest.TestCase):
+    """
+    Tests for saving models through storage with group commit enabled
+    """
+
+    def setUp(self):
+        """
+        Enable group commit on the app storage
+        """
+
+        storage.enable_group_commit(0.002)
+
+    def tearDown(self):
+        """
+        Restore per request commits
+        """
+
+        storage.disable_group_commit()
+
+    def test_save_and_delete(self):
+        """
+        Test that saved objects stay usable in the request session
+        """
+        user = User(userId=str(uuid.uuid4()), firstName="Group",
+                    lastName="Commit", email="group@example.com",
+                    password="password")
+        org = Organisation(orgId=str(uuid.uuid4()), name="Group org")
+        user.organisations.append(org)
+
+        self.assertTrue(user.save())
+        self.assertTrue(inspect(user).persistent)
+        self.assertTrue(inspect(org).persistent)
+        self.assertEqual([o.orgId for o in user.organisations], [org.orgId])
+
+        fetched = storage.fetch(User, limit=1, email="group@example.com")
+        self.assertEqual(fetched.userId, user.userId)
+
+        user.delete()
+        self.assertIsNone(
+            storage.fetch(User, limit=1, email="group@example.com"))
+
+    def test_membership_removal(self):
+        """
+        Test that removing a member from either side is committed
+        """
+        user = User(userId=str(uuid.uuid4()), firstName="Group",
+                    lastName="Commit", email="member@example.com",
+                    password="password")
+        first = Organisation(orgId=str(uuid.uuid4()), name="First")
+        second = Organisation(orgId=str(uuid.uuid4()), name="Second")
+        user.organisations.append(first)
+        user.organisations.append(second)
+        self.assertTrue(user.save())
+
+        first.users.remove(user)
+        self.assertTrue(first.save())
+        user.organisations.remove(second)
+        self.assertTrue(user.save())
+        self.assertEqual(list(user.organisations), [])
+
+        user.delete()
+        first.delete()
+        second.delete()
+
+    def test_timed_out_write_is_not_committed(self):
+        """
+        Test that a write that never started is cancelled on timeout
+        """
+        storage.disable_group_commit()
+        storage.enable_group_commit(1.0, timeout=0.2)
+
+        org = Organisation(orgId=str(uuid.uuid4()), name="Too late")
+        self.assertFalse(org.save())
+
+        # let the writer reach the end of its window
+        time.sleep(1.5)
+        self.assertIsNone(storage.fetch(Organisation, limit=1,
+                                        orgId=org.orgId))
+        self.assertEqual(storage.committer.stats()["failed"], 0)
+
+    def test_running_write_is_waited_for(self):
+        """
+        Test that a write that started before the timeout is not reported
+        as failed while it is being committed
+        """
+        storage.disable_group_commit()
+        storage.enable_group_commit(0.002, timeout=0.1)
+
+        def slow(session, flush_context, instances):
+            time.sleep(0.3)
+
+        event.listen(storage.committer.session, "before_flush", slow)
+        org = Organisation(orgId=str(uuid.uuid4()), name="Slow")
+        self.assertTrue(org.save())
+        self.assertIsNotNone(storage.fetch(Organisation, limit=1,
+                                           orgId=org.orgId))
+        org.delete()
+
+    def test_failed_save_returns_false(self):
+        """
+        Test that a failing write is reported and leaves storage usable
+        """
+        user = User(userId=str(uuid.uuid4()), firstName="Group",
+                    lastName="Commit", email="dup@example.com",
+                    password="password")
+        self.assertTrue(user.save())
+
+        duplicate = User(userId=str(uuid.uuid4()), firstName="Group",
+                         lastName="Commit", email="dup@example.com",
+                         password="password")
+        self.assertFalse(duplicate.save())
+        self.assertTrue(inspect(duplicate).transient)
+        self.assertEqual(
+            len(storage.fetch(User, email="dup@example.com")), 1)
+        self.assertEqual(storage.committer.stats()["failed"], 1)
+
+        user.delete()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+"""
+Tests for the cache invalidation bus
+"""
+
+from api.app import app
+from api import bus
+from api.invalidation import InvalidationBus, membership_key
+import os
+import tempfile
+import time
+import unittest
+from api.models import User, Organisation
+
+app.config['TESTING'] = True
+
+class InvalidationBusTestCase(unittest.TestCase):
+    """
+    Tests for publishing and receiving change events
+    """
+
+    def setUp(self):
+        """
+        Set up an outbox shared by two buses
+        """
+
+        path = os.path.join(tempfile.mkdtemp(), "outbox.db")
+        self.writer = InvalidationBus(path=path)
+        self.reader = InvalidationBus(path=path, interval=0.01)
+
+    def test_events_reach_other_workers(self):
+        """
+        Test that events go through the outbox to another bus only
+        """
+        evicted = []
+        self.reader.subscribe(
+            lambda table, key: evicted.append((table, key)), table="users")
+
+        self.writer.publish([("users", "u1"), ("organisations", "o1")])
+
+        self.assertEqual(self.writer.poll(), 0)
+        self.assertEqual(self.reader.poll(), 2)
+        self.assertEqual(evicted, [("users", "u1")])
+        self.assertEqual(self.reader.stats()["received"], 2)
+        self.assertEqual(self.reader.poll(), 0)
+
+    def test_failing_subscriber_is_isolated(self):
+        """
+        Test that a raising callback neither stops other callbacks
+        nor the polling thread
+        """
+        evicted = []
+
+        def broken(table, key):
+            raise ValueError(key)
+
+        self.reader.subscribe(broken)
+        self.reader.subscribe(lambda table, key: evicted.append(key))
+        self.reader.start()
+        try:
+            self.writer.publish([("users", "u1")])
+            self.writer.publish([("users", "u2")])
+            deadline = time.time() + 5
+            while len(evicted) < 2 and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            self.reader.stop()
+
+        self.assertEqual(evicted, ["u1", "u2"])
+        self.assertEqual(self.reader.stats()["callbackErrors"], 2)
+
+    def test_forked_worker_gets_own_origin(self):
+        """
+        Test that a forked worker gets its own origin and that its events
+        reach the parent
+        """
+        self.writer.publish([("users", "u0")])
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read)
+            self.writer.after_fork()
+            self.writer.publish([("users", "u1")])
+            os.write(write, f"{bus.origin} {self.writer.origin}".encode())
+            os._exit(0)
+        os.close(write)
+        child_bus, child_writer = os.read(read, 128).decode().split()
+        os.waitpid(pid, 0)
+        os.close(read)
+
+        # the app bus is reset by its fork hook
+        self.assertNotEqual(child_bus, bus.origin)
+        self.assertNotEqual(child_writer, self.writer.origin)
+        self.assertEqual(self.writer.poll(), 1)
+
+    def test_committed_changes_are_published(self):
+        """
+        Test that saving models publishes user, org and membership events
+        """
+        events = []
+        listener = lambda table, key: events.append((table, key))
+        bus.subscribe(listener)
+        try:
+            org = Organisation(name="Bus org", orgId="bus-org")
+            org.save()
+            user = User(userId="bus-user", firstName="Bus", lastName="User",
+                        email="bus@example.com", password="password")
+            user.save()
+            org.users.append(user)
+            org.save()
+        finally:
+            bus.unsubscribe(listener)
+
+        self.assertIn(("organisations", "bus-org"), events)
+        self.assertIn(("users", "bus-user"), events)
+        self.assertIn(membership_key("bus-user", "bus-org"), events)
+
+        # deleting the user drops its memberships too
+        events.clear()
+        bus.subscribe(listener)
+        try:
+            user.delete()
+        finally:
+            bus.unsubscribe(listener)
+        self.assertIn(("users", "bus-user"), events)
+        self.assertIn(membership_key("bus-user", "bus-org"), events)
+
+
+if __name__ == "__main__":
+    unittest.main()